@@ -14,13 +14,136 @@ https://api.together.xyz/v1/images/generations
 https://api.hyperbolic.xyz/v1/image/generation
 """
 
+import asyncio
 import base64
+import binascii
+import itertools
+import json
 import os
-from typing import Any, Dict, Generator, Iterator, List, Union
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    AsyncGenerator,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
 import requests
 from open_webui.utils.misc import get_last_user_message
 from pydantic import BaseModel, Field
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    # libbase64 (AVX2/SSSE3/NEON dispatch), encodes straight to str without a bytes copy
+    from pybase64 import b64encode_as_string as _b64encode_str
+except ImportError:
+    try:
+        # SIMD-accelerated drop-in for the stdlib encoder, if installed
+        from base64_utils import b64encode as _b64encode
+    except ImportError:
+        from base64 import b64encode as _b64encode
+
+    def _b64encode_str(data: bytes) -> str:
+        """
+        Base64-encode data to a str.
+
+        Args:
+            data (bytes): The data to encode.
+
+        Returns:
+            str: The base64-encoded data.
+        """
+        return _b64encode(data).decode("ascii")
+
+
+try:
+    # faster JSON parsing of the provider responses, if installed
+    from orjson import loads as _loads
+except ImportError:
+    from json import loads as _loads
+
+# raw bytes per streamed piece; 12 KiB becomes 16 KiB of base64
+_STREAM_CHUNK = 12 * 1024
+
+# stands in for the prompt in the pre-serialized payload templates
+_PROMPT_PLACEHOLDER = "\x00PROMPT\x00"
+_PROMPT_TOKEN = json.dumps(_PROMPT_PLACEHOLDER).encode()
+
+# leading magic bytes of the supported image formats (webp also needs "WEBP" at 8:12)
+_MAGIC = {
+    b"\xff\xd8\xff": "jpeg",
+    b"\x89PNG": "png",
+    b"GIF8": "gif",
+    b"RIFF": "webp",
+}
+
+
+def _sniff_ext(raw: bytes) -> Optional[str]:
+    """
+    Get the image extension from the magic bytes of raw image data.
+
+    Args:
+        raw (bytes): Raw image data, bytes or bytearray (the first 12 bytes are enough).
+
+    Returns:
+        Optional[str]: The image extension or None if unsupported.
+    """
+    head = bytes(raw[:12])
+    ext = _MAGIC.get(head[:4]) or _MAGIC.get(head[:3])
+    if ext == "webp" and head[8:12] != b"WEBP":
+        return None
+    return ext
+
+
+def _output_urls(output: Union[str, List[str], None]) -> List[str]:
+    """
+    Normalize a replicate.com prediction output to a list of image URLs.
+
+    Args:
+        output (Union[str, List[str], None]): A single URL or a list of URLs.
+
+    Returns:
+        List[str]: The image URLs.
+    """
+    if isinstance(output, str):
+        return [output]
+    return list(output or [])
+
+
+def _b64_chunks(chunks: Iterable[bytes]) -> Generator[str, None, None]:
+    """
+    Base64-encode a byte stream incrementally.
+
+    Each piece is encoded on a 3-byte boundary (the remainder is carried over),
+    so the concatenated output equals encoding the whole stream at once.
+
+    Args:
+        chunks (Iterable[bytes]): The raw byte chunks.
+
+    Yields:
+        str: Base64-encoded pieces.
+    """
+    carry = b""
+    for chunk in chunks:
+        if carry:
+            chunk = carry + chunk
+        cut = len(chunk) - len(chunk) % 3
+        carry = bytes(chunk[cut:])
+        if cut:
+            yield _b64encode_str(chunk[:cut])
+    if carry:
+        yield _b64encode_str(carry)
 
 
 class Pipe:
@@ -45,6 +168,51 @@ class Pipe:
             description="before the input example for replicate.com https://replicate.com/bytedance/sdxl-lightning-4step/api",
         )
 
+    # extra headers per provider, merged over the common ones
+    HEADERS_MAP: Dict[str, Dict[str, str]] = {
+        "huggingface.co": {"x-wait-for-model": "true"},
+        "replicate.com": {"Prefer": "wait"},
+        "together.xyz": {},
+        "hyperbolic.xyz": {},
+    }
+
+    # static payload per provider; the prompt (None here) is filled in per request
+    PAYLOAD_MAP: Dict[str, Dict[str, Any]] = {
+        "huggingface.co": {"inputs": None},
+        "replicate.com": {
+            "input": {
+                "prompt": None,
+                "go_fast": True,
+                "num_outputs": 1,
+                "aspect_ratio": "1:1",
+                "output_format": "webp",
+                "output_quality": 90,
+            },
+        },
+        "together.xyz": {
+            "model": "black-forest-labs/FLUX.1-schnell-Free",
+            "prompt": None,
+            "width": 1024,
+            "height": 1024,
+            "steps": 4,
+            "n": 1,
+            "response_format": "b64_json",
+        },
+        "hyperbolic.xyz": {
+            "model_name": "FLUX.1-dev",
+            "prompt": None,
+            "steps": 25,
+            "cfg_scale": 5,
+            "enable_refiner": False,
+            "height": 1024,
+            "width": 1024,
+            "backend": "auto",
+        },
+    }
+
+    # one compiled alternation over the provider keys, so detection is a single scan
+    _PROVIDER_RE = re.compile("|".join(re.escape(key) for key in PAYLOAD_MAP))
+
     def __init__(self):
         """
         Initialize the Pipe class with default values and environment variables.
@@ -59,6 +227,271 @@ class Pipe:
                 "https://api-inference.huggingface.co/models/black-forest-labs/FLUX.1-schnell",
             ),
         )
+        # reuse keep-alive connections across generations (saves a TLS handshake per call)
+        # and retry transient 429/5xx (e.g. model cold-start) with exponential backoff;
+        # the last response is returned as-is so raise_for_status reports it; read
+        # errors are never retried, since the provider may already have accepted
+        # (and billed) a POST that timed out
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=20,
+            max_retries=Retry(
+                total=3,
+                read=False,
+                backoff_factor=0.5,
+                status_forcelist=[429, 502, 503, 504],
+                allowed_methods=["GET", "POST"],
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            ),
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # (connect, read) timeouts: image downloads should be quick, while inference
+        # (incl. replicate.com cold-starts) can take well over a minute
+        self._img_timeout = (3.05, 30)
+        self._api_timeout = (3.05, 120)
+        # total seconds a streamed replicate.com prediction may be polled for
+        self._prediction_timeout = 300.0
+        # bound the number of generations in flight; created lazily inside the event loop
+        self.max_concurrency = 5
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # downloaded images keyed by URL without query (signed output URLs are
+        # immutable), bounded by their total size in bytes
+        self.image_cache_bytes = 128 << 20
+        self._image_cache: "OrderedDict[str, Tuple[bytes, str]]" = OrderedDict()
+        self._image_cache_used = 0
+        self._image_cache_lock = threading.Lock()
+        # BEFORE_INPUT_STRING parsed once, re-parsed only when the valve changes
+        self._replicate_prefix_src: Optional[str] = None
+        self._replicate_prefix: Dict[str, Any] = {}
+        # provider and merged headers, recomputed only when the URL or key changes
+        self._provider_src: Optional[Tuple[str, str]] = None
+        self._provider: Optional[str] = None
+        self._headers: Dict[str, str] = {}
+        # JSON payload templates per provider, rebuilt when BEFORE_INPUT_STRING changes
+        self._payload_templates_src: Optional[str] = None
+        self._payload_templates: Dict[str, bytes] = {}
+
+    def _get_replicate_prefix(self) -> Dict[str, Any]:
+        """
+        Get the parsed BEFORE_INPUT_STRING, caching it until the valve changes.
+
+        Returns:
+            Dict[str, Any]: The fields to insert before the replicate.com input.
+        """
+        src = self.valves.BEFORE_INPUT_STRING
+        if src != self._replicate_prefix_src:
+            # the valve is a JSON object body, usually with a trailing comma
+            self._replicate_prefix = json.loads("{" + src.strip().rstrip(",") + "}")
+            self._replicate_prefix_src = src
+        return self._replicate_prefix
+
+    def _get_provider_config(self) -> Tuple[Optional[str], Dict[str, str]]:
+        """
+        Get the provider matching the base URL and its request headers.
+
+        Returns:
+            Tuple[Optional[str], Dict[str, str]]: The provider key (None if
+            unsupported) and the headers to send.
+        """
+        src = (self.valves.FLUX_SCHNELL_API_BASE_URL, self.valves.FLUX_SCHNELL_API_KEY)
+        if src != self._provider_src:
+            base_url, api_key = src
+            match = self._PROVIDER_RE.search(base_url)
+            self._provider = match.group(0) if match else None
+            self._headers = {
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json",
+                **self.HEADERS_MAP.get(self._provider, {}),
+            }
+            self._provider_src = src
+        return self._provider, self._headers
+
+    def _build_payload(self, provider: str, prompt: Optional[str]) -> Dict[str, Any]:
+        """
+        Build the request payload for a provider.
+
+        Args:
+            provider (str): The provider key.
+            prompt (Optional[str]): The user prompt.
+
+        Returns:
+            Dict[str, Any]: The payload for the request.
+        """
+        template = self.PAYLOAD_MAP[provider]
+        if provider == "replicate.com":
+            # Insert the version string from BEFORE_INPUT_STRING
+            return {
+                **self._get_replicate_prefix(),
+                "input": {**template["input"], "prompt": prompt},
+            }
+        elif provider == "huggingface.co":
+            return {"inputs": prompt}
+        return {**template, "prompt": prompt}
+
+    def _encode_payload(self, provider: str, prompt: Optional[str]) -> bytes:
+        """
+        Get the JSON-encoded request payload for a provider.
+
+        The static part of the payload is serialized once per provider; only the
+        prompt is encoded per request and spliced into the template.
+
+        Args:
+            provider (str): The provider key.
+            prompt (Optional[str]): The user prompt.
+
+        Returns:
+            bytes: The JSON-encoded payload for the request.
+        """
+        if self.valves.BEFORE_INPUT_STRING != self._payload_templates_src:
+            self._payload_templates.clear()
+            self._payload_templates_src = self.valves.BEFORE_INPUT_STRING
+
+        template = self._payload_templates.get(provider)
+        if template is None:
+            template = json.dumps(
+                self._build_payload(provider, _PROMPT_PLACEHOLDER)
+            ).encode()
+            self._payload_templates[provider] = template
+        return template.replace(_PROMPT_TOKEN, json.dumps(prompt).encode())
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """
+        Get the semaphore limiting concurrent outbound requests.
+
+        Returns:
+            asyncio.Semaphore: The shared semaphore.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def _run_blocking(self, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run a blocking call in the default executor so the event loop stays free.
+
+        Args:
+            func (Callable[..., Any]): The blocking function.
+            *args (Any): Positional arguments for the function.
+
+        Returns:
+            Any: The return value of the function.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, func, *args)
+
+    def _cache_get(self, url: str) -> Optional[Tuple[bytes, str]]:
+        """
+        Look up a downloaded image in the LRU cache.
+
+        Args:
+            url (str): The URL of the image.
+
+        Returns:
+            Optional[Tuple[bytes, str]]: The raw image bytes and their content
+            type, or None on a miss.
+        """
+        key = url.split("?", 1)[0]
+        with self._image_cache_lock:
+            hit = self._image_cache.get(key)
+            if hit is not None:
+                self._image_cache.move_to_end(key)
+            return hit
+
+    def _cache_put(self, url: str, raw: bytes, content_type: str) -> None:
+        """
+        Store a downloaded image in the LRU cache, evicting the oldest entries
+        while the cached images exceed image_cache_bytes in total.
+
+        Args:
+            url (str): The URL of the image.
+            raw (bytes): The raw image bytes.
+            content_type (str): The content type of the image.
+        """
+        if len(raw) > self.image_cache_bytes:
+            return
+        key = url.split("?", 1)[0]
+        with self._image_cache_lock:
+            old = self._image_cache.pop(key, None)
+            if old is not None:
+                self._image_cache_used -= len(old[0])
+            self._image_cache[key] = (raw, content_type)
+            self._image_cache_used += len(raw)
+            while self._image_cache_used > self.image_cache_bytes:
+                _, (evicted, _) = self._image_cache.popitem(last=False)
+                self._image_cache_used -= len(evicted)
+
+    def _get_image(self, url: str) -> requests.Response:
+        """
+        Start a streamed download of an image.
+
+        Args:
+            url (str): The URL of the image.
+
+        Returns:
+            requests.Response: The (unread) response object.
+        """
+        headers = {"Authorization": f"Bearer {self.valves.FLUX_SCHNELL_API_KEY}"}
+        return self.session.get(
+            url, headers=headers, stream=True, timeout=self._img_timeout
+        )
+
+    def _fetch_image_bytes(self, url: str) -> Tuple[bytes, str]:
+        """
+        Download an image, streaming it into a single buffer.
+
+        Args:
+            url (str): The URL of the image.
+
+        Returns:
+            Tuple[bytes, str]: The raw image bytes and their content type.
+        """
+        cached = self._cache_get(url)
+        if cached is not None:
+            return cached
+
+        with self._get_image(url) as response:
+            response.raise_for_status()
+
+            content_type = response.headers.get(
+                "Content-Type", "application/octet-stream"
+            )
+            # avoid response.content, which joins the chunks into a second copy
+            buf = bytearray()
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                buf.extend(chunk)
+        # immutable, since the same object is shared with every cache hit
+        raw = bytes(buf)
+        del buf
+        self._cache_put(url, raw, content_type)
+        return raw, content_type
+
+    def _iter_image_chunks(self, url: str) -> Generator[bytes, None, None]:
+        """
+        Download an image chunk by chunk, serving it from the cache if possible.
+
+        Only the buffered path fills the cache, so streaming keeps at most one
+        chunk of a fresh download in memory.
+
+        Args:
+            url (str): The URL of the image.
+
+        Yields:
+            bytes: Raw image chunks.
+        """
+        cached = self._cache_get(url)
+        if cached is not None:
+            raw = memoryview(cached[0])
+            for i in range(0, len(raw), _STREAM_CHUNK):
+                yield raw[i : i + _STREAM_CHUNK]
+            return
+
+        # not cached on a miss: that would hold the whole image again
+        with self._get_image(url) as response:
+            response.raise_for_status()
+            yield from response.iter_content(chunk_size=_STREAM_CHUNK)
 
     def url_to_img_data(self, url: str) -> str:
         """
@@ -70,19 +503,203 @@ class Pipe:
         Returns:
             str: Base64-encoded image data.
         """
-        headers = {"Authorization": f"Bearer {self.valves.FLUX_SCHNELL_API_KEY}"}
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-
-        content_type = response.headers.get("Content-Type", "application/octet-stream")
-        encoded_content = base64.b64encode(response.content).decode("utf-8")
+        raw, content_type = self._fetch_image_bytes(url)
+        encoded_content = _b64encode_str(raw)
         return f"data:{content_type};base64,{encoded_content}"
 
-    def stream_response(
-        self, headers: Dict[str, str], payload: Dict[str, Any]
+    def stream_image(
+        self, chunks: Iterable[bytes], content_type: str = ""
     ) -> Generator[str, None, None]:
+        """
+        Stream an image as a markdown data URL, one chunk at a time.
+
+        Args:
+            chunks (Iterable[bytes]): The raw image chunks.
+            content_type (str): Fallback content type if the format can't be sniffed.
+
+        Yields:
+            str: Pieces of the formatted image data or an error message.
+        """
+        chunks = iter(chunks)
+        first = next(chunks, b"")
+        img_ext = _sniff_ext(first)
+        if not img_ext and "image/" in content_type:
+            img_ext = content_type.split("/")[-1]
+        if not img_ext:
+            yield "Error: Unsupported image format!"
+            return
+
+        yield f"![Image](data:image/{img_ext};base64,"
+        try:
+            yield from _b64_chunks(itertools.chain([first], chunks))
+        except Exception:
+            # close the open data URL so the error that follows renders as text
+            yield ")\n"
+            raise
+        yield f")\n`GeneratedImage.{img_ext}`"
+
+    def cancel_prediction(self, resp: Dict[str, Any], headers: Dict[str, str]) -> None:
+        """
+        Cancel a pending replicate.com prediction so it stops running (and billing).
+
+        Args:
+            resp (Dict[str, Any]): The pending prediction.
+            headers (Dict[str, str]): The headers for the request.
+        """
+        cancel_url = resp.get("urls", {}).get("cancel")
+        if not cancel_url:
+            return
+        try:
+            self.session.post(cancel_url, headers=headers, timeout=self._api_timeout)
+        except requests.exceptions.RequestException:
+            # best effort; the timeout is reported either way
+            pass
+
+    def poll_prediction(
+        self,
+        resp: Dict[str, Any],
+        headers: Dict[str, str],
+        stop: Optional[threading.Event] = None,
+    ) -> Generator[str, None, Dict[str, Any]]:
+        """
+        Poll a pending replicate.com prediction until it settles, reporting progress.
 
-        yield self.non_stream_response(headers, payload)
+        Polls reuse the session's keep-alive connection; the wait runs in the
+        executor thread driving the stream, so the event loop stays free. A
+        prediction still pending after the poll budget, or when the stream is
+        abandoned (stop set or generator closed), is cancelled.
+
+        Args:
+            resp (Dict[str, Any]): The prediction as returned on submission.
+            headers (Dict[str, str]): The headers for the request.
+            stop (Optional[threading.Event]): Set when the client has gone away.
+
+        Yields:
+            str: A progress line whenever the prediction status changes.
+
+        Returns:
+            Dict[str, Any]: The settled (or canceled) prediction.
+        """
+        if stop is None:
+            stop = threading.Event()
+        poll_url = resp.get("urls", {}).get("get")
+        deadline = time.monotonic() + self._prediction_timeout
+        status = None
+        try:
+            while resp.get("status") in ("starting", "processing") and poll_url:
+                if resp["status"] != status:
+                    status = resp["status"]
+                    yield f"⏳ {status}\n"
+                if time.monotonic() > deadline:
+                    self.cancel_prediction(resp, headers)
+                    raise TimeoutError("prediction did not finish in time")
+                if stop.wait(0.5):
+                    self.cancel_prediction(resp, headers)
+                    return {**resp, "status": "canceled"}
+                poll = self.session.get(
+                    poll_url, headers=headers, timeout=self._api_timeout
+                )
+                poll.raise_for_status()
+                resp = _loads(poll.content)
+        except GeneratorExit:
+            # closed while waiting on a status line to be consumed
+            if resp.get("status") in ("starting", "processing"):
+                self.cancel_prediction(resp, headers)
+            raise
+        return resp
+
+    def iter_stream_response(
+        self,
+        headers: Dict[str, str],
+        payload: bytes,
+        stop: Optional[threading.Event] = None,
+    ) -> Generator[str, None, None]:
+        """
+        Get a streaming response from the API.
+
+        Images are yielded as they are downloaded, so the first bytes reach the
+        client before the whole image has been fetched and encoded.
+
+        Args:
+            headers (Dict[str, str]): The headers for the request.
+            payload (bytes): The JSON-encoded payload for the request.
+            stop (Optional[threading.Event]): Set when the client has gone away.
+
+        Yields:
+            str: Pieces of the response from the API.
+        """
+        try:
+            with self.session.post(
+                url=self.valves.FLUX_SCHNELL_API_BASE_URL,
+                headers=headers,
+                data=payload,
+                stream=True,
+                timeout=self._api_timeout,
+            ) as response:
+                response.raise_for_status()
+
+                content_type = response.headers.get("Content-Type", "")
+                if "image/" in content_type:
+                    yield from self.stream_image(
+                        response.iter_content(chunk_size=_STREAM_CHUNK), content_type
+                    )
+                elif "application/json" in content_type:
+                    resp = _loads(response.content)
+                    resp = yield from self.poll_prediction(resp, headers, stop)
+                    if resp.get("status") in ("failed", "canceled"):
+                        yield f"Error: Prediction {resp['status']}: {resp.get('error')}"
+                    elif "output" in resp:
+                        urls = _output_urls(resp["output"])
+                        if not urls:
+                            yield f"Error: Unexpected response format for the image provider! {resp}"
+                        for i, url in enumerate(urls):
+                            if i:
+                                yield "\n\n"
+                            yield from self.stream_image(self._iter_image_chunks(url))
+                    else:
+                        # already fully in memory as base64, nothing to stream
+                        yield self.handle_json_response(response)
+                else:
+                    yield f"Error: Unsupported content type {content_type}"
+
+        except requests.exceptions.RequestException as e:
+            yield f"Error: Request failed: {e}"
+        except Exception as e:
+            yield f"Error: {e}"
+
+    async def stream_response(
+        self, headers: Dict[str, str], payload: bytes
+    ) -> AsyncGenerator[str, None]:
+        """
+        Get a streaming response from the API without blocking the event loop.
+
+        Args:
+            headers (Dict[str, str]): The headers for the request.
+            payload (bytes): The JSON-encoded payload for the request.
+
+        Yields:
+            str: Pieces of the response from the API.
+        """
+        async with self._get_semaphore():
+            loop = asyncio.get_running_loop()
+            stop = threading.Event()
+            chunks = self.iter_stream_response(headers, payload, stop)
+            pending: Optional[asyncio.Future] = None
+            try:
+                while True:
+                    pending = loop.run_in_executor(None, next, chunks, None)
+                    # shielded, so a cancelled task doesn't lose track of the thread
+                    chunk = await asyncio.shield(pending)
+                    if chunk is None:
+                        break
+                    yield chunk
+            finally:
+                # wake a polling thread so it cancels the prediction and returns,
+                # then close the generator once no thread is inside it
+                stop.set()
+                if pending is not None and not pending.done():
+                    await asyncio.wait({pending})
+                await loop.run_in_executor(None, chunks.close)
 
     def get_img_extension(self, img_data: str) -> Union[str, None]:
         """
@@ -94,15 +711,12 @@ class Pipe:
         Returns:
             Union[str, None]: The image extension or None if unsupported.
         """
-        if img_data.startswith("/9j/"):
-            return "jpeg"
-        elif img_data.startswith("iVBOR"):
-            return "png"
-        elif img_data.startswith("R0lG"):
-            return "gif"
-        elif img_data.startswith("UklGR"):
-            return "webp"
-        return None
+        # 16 base64 chars decode to the 12 bytes _sniff_ext needs
+        try:
+            head = base64.b64decode(img_data[:16])
+        except (binascii.Error, ValueError):
+            return None
+        return _sniff_ext(head)
 
     def handle_json_response(self, response: requests.Response) -> str:
         """
@@ -114,28 +728,46 @@ class Pipe:
         Returns:
             str: The formatted image data or an error message.
         """
-        resp = response.json()
+        resp = _loads(response.content)
         if "output" in resp:
-            img_url = resp["output"][0]
-            img_data = self.url_to_img_data(img_url)
+            urls = _output_urls(resp["output"])
+            if not urls:
+                return (
+                    f"Error: Unexpected response format for the image provider! {resp}"
+                )
+            if len(urls) > 1:
+                # download multiple outputs concurrently over the shared session pool
+                with ThreadPoolExecutor(max_workers=min(8, len(urls))) as executor:
+                    downloads = list(executor.map(self._fetch_image_bytes, urls))
+            else:
+                downloads = [self._fetch_image_bytes(urls[0])]
+
+            images = []
+            for raw, _ in downloads:
+                # sniff the raw bytes and encode them once, no data URL round-trip
+                img_ext = _sniff_ext(raw)
+                if not img_ext:
+                    return f"Error: Unsupported image format! \n\n {resp}"
+                img_data = _b64encode_str(raw)
+                images.append(
+                    f"![Image](data:image/{img_ext};base64,{img_data})\n`GeneratedImage.{img_ext}`"
+                )
+            return "\n\n".join(images)
         elif "data" in resp and "b64_json" in resp["data"][0]:
             img_data = resp["data"][0]["b64_json"]
+            # usually bare base64; strip a data URL prefix, looking only at the head
+            sep = img_data.find(";base64,", 0, 256)
+            if sep != -1:
+                img_data = img_data[sep + 8 :]
+            img_ext = self.get_img_extension(img_data)
         else:
-            return "Error: Unexpected response format for the image provider! {resp}"
+            return f"Error: Unexpected response format for the image provider! {resp}"
 
-        # split ;base64, from img_data
-        try:
-            img_data = img_data.split(";base64,")[1]
-        except IndexError:
-            pass
-
-        img_ext = self.get_img_extension(img_data[:9])
         if not img_ext:
             return f"Error: Unsupported image format! \n\n {resp} \n\n {img_data}"
 
-        # rebuild img_data with proper format
-        img_data = f"data:image/{img_ext};base64,{img_data}"
-        return f"![Image]({img_data})\n`GeneratedImage.{img_ext}`"
+        # the (potentially MB-sized) data URL is formatted exactly once
+        return f"![Image](data:image/{img_ext};base64,{img_data})\n`GeneratedImage.{img_ext}`"
 
     def handle_image_response(self, response: requests.Response) -> str:
         """
@@ -152,29 +784,27 @@ class Pipe:
         img_ext = "png"
         if "image/" in content_type:
             img_ext = content_type.split("/")[-1]
-        image_base64 = base64.b64encode(response.content).decode("utf-8")
+        image_base64 = _b64encode_str(response.content)
         return f"![Image](data:{content_type};base64,{image_base64})\n`GeneratedImage.{img_ext}`"
 
-    def non_stream_response(
-        self, headers: Dict[str, str], payload: Dict[str, Any]
-    ) -> str:
+    def non_stream_response(self, headers: Dict[str, str], payload: bytes) -> str:
         """
         Get a non-streaming response from the API.
 
         Args:
             headers (Dict[str, str]): The headers for the request.
-            payload (Dict[str, Any]): The payload for the request.
+            payload (bytes): The JSON-encoded payload for the request.
 
         Returns:
             str: The response from the API.
         """
         try:
-            response = requests.post(
+            response = self.session.post(
                 url=self.valves.FLUX_SCHNELL_API_BASE_URL,
                 headers=headers,
-                json=payload,
+                data=payload,
                 stream=False,
-                timeout=(3.05, 60),
+                timeout=self._api_timeout,
             )
             response.raise_for_status()
 
@@ -200,87 +830,44 @@ class Pipe:
         """
         return [{"id": "flux_schnell", "name": "Schnell"}]
 
-    def pipe(
-        self, body: Dict[str, Any]
-    ) -> Union[str, Generator[str, None, None], Iterator[str]]:
+    async def pipe(self, body: Dict[str, Any]) -> Union[str, AsyncGenerator[str, None]]:
         """
         Process the pipe request.
 
+        The blocking HTTP work runs in the default executor, so a single worker
+        can serve several concurrent generations.
+
         Args:
             body (Dict[str, Any]): The request body.
 
         Returns:
-            Union[str, Generator[str, None, None], Iterator[str]]: The response from the API.
-        """
-        headers = {
-            "Authorization": f"Bearer {self.valves.FLUX_SCHNELL_API_KEY}",
-            "Content-Type": "application/json",
-        }
-
-        body["stream"] = False
-        prompt = get_last_user_message(body["messages"])
-
-        headers_map = {
-            "huggingface.co": {"x-wait-for-model": "true"},
-            "replicate.com": {"Prefer": "wait"},
-            "together.xyz": {},
-            "hyperbolic.xyz": {},
-        }
-
-        payload_map = {
-            "huggingface.co": {"inputs": prompt},
-            "replicate.com": {
-                **{
-                    # Insert the version string from BEFORE_INPUT_STRING
-                    **eval(
-                        f"{{{self.valves.BEFORE_INPUT_STRING}}}"
-                    ),  # Use eval to parse the string as a dictionary
-                    "input": {
-                        "prompt": prompt,
-                        "go_fast": True,
-                        "num_outputs": 1,
-                        "aspect_ratio": "1:1",
-                        "output_format": "webp",
-                        "output_quality": 90,
-                    },
-                }
-            },
-            "together.xyz": {
-                "model": "black-forest-labs/FLUX.1-schnell-Free",
-                "prompt": prompt,
-                "width": 1024,
-                "height": 1024,
-                "steps": 4,
-                "n": 1,
-                "response_format": "b64_json",
-            },
-            "hyperbolic.xyz": {
-                "model_name": "FLUX.1-dev",
-                "prompt": prompt,
-                "steps": 25,
-                "cfg_scale": 5,
-                "enable_refiner": False,
-                "height": 1024,
-                "width": 1024,
-                "backend": "auto",
-            },
-        }
-
-        payload = None
-        for key in payload_map:
-            if key in self.valves.FLUX_SCHNELL_API_BASE_URL:
-                payload = payload_map[key]
-                headers.update(headers_map.get(key, {}))
-                break
+            Union[str, AsyncGenerator[str, None]]: The response from the API.
+        """
+        messages = body["messages"]
+        # the prompt is almost always the final (plain text) message; only scan
+        # back, or unpack multimodal content, otherwise
+        last = messages[-1] if messages else {}
+        if last.get("role") == "user" and isinstance(last.get("content"), str):
+            prompt = last["content"]
+        else:
+            prompt = get_last_user_message(messages)
 
-        if payload is None:
+        provider, headers = self._get_provider_config()
+        if provider is None:
             return "Error: Unsupported API base URL! Remember, that's the beauty of open-source: you can add your own..."
 
         try:
+            payload = self._encode_payload(provider, prompt)
             if body.get("stream", False):
+                if provider == "replicate.com":
+                    # submit without blocking on the result; the stream polls it
+                    headers = {k: v for k, v in headers.items() if k != "Prefer"}
                 return self.stream_response(headers, payload)
             else:
-                return self.non_stream_response(headers, payload)
+                async with self._get_semaphore():
+                    return await self._run_blocking(
+                        self.non_stream_response, headers, payload
+                    )
         except requests.exceptions.RequestException as e:
             return f"Error: Request failed: {e}"
         except Exception as e: